@@ -1,31 +1,143 @@
+import asyncio
+import hashlib
+import logging
 import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone, date
-from typing import List, Optional, Literal
+from typing import List, Optional, Literal, Tuple
+from urllib.parse import urlencode
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordBearer
-from pydantic import BaseModel, EmailStr, Field
-from jose import jwt, JWTError
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, TypeAdapter, field_validator
+import jwt
+from jwt import InvalidTokenError as JWTError
 from passlib.context import CryptContext
 from bson import ObjectId
+from pymongo import UpdateOne
+from cachetools import TTLCache
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.decorator import cache
+from redis import asyncio as aioredis
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from slowapi.util import get_remote_address
 
 from database import db
 
+logger = logging.getLogger(__name__)
+
 # Environment & Security setup
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 12
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+LIST_CACHE_TTL_SECONDS = int(os.getenv("LIST_CACHE_TTL_SECONDS", "10"))
+REDIS_URL = os.getenv("REDIS_URL")
+LOGIN_RATE_LIMIT = os.getenv("LOGIN_RATE_LIMIT", "10/minute")
+# Comma-separated allowed origins; empty means no cross-origin access. "*" must be set explicitly.
+CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "").split(",") if o.strip()]
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))
+PASSWORD_CACHE_SIZE = 4096
+
+STUDENT_LIST_PROJECTION = {"first_name": 1, "last_name": 1, "email": 1, "grade": 1}
+CURRENT_USER_PROJECTION = {"email": 1, "role": 1, "token_version": 1}
+ANNOUNCEMENT_LIST_PROJECTION = {"title": 1, "message": 1, "created_at": 1}
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-app = FastAPI(title="School Management System API")
+# Decoded token payload and user document, keyed by a digest of the bearer token
+_auth_cache: TTLCache = TTLCache(maxsize=10000, ttl=AUTH_CACHE_TTL_SECONDS)
+
+# ----------------------- Response Cache -----------------------
+def list_cache_key(func, namespace: str = "", *, request=None, response=None, args=(), kwargs=None):
+    """Cache key from path, sorted query params and the caller's role"""
+    # Custom key builders get the bare namespace; prefix it like default_key_builder so
+    # FastAPICache.clear(namespace=...) matches the stored keys
+    prefix = f"{FastAPICache.get_prefix()}:{namespace}"
+    role = ((kwargs or {}).get("current") or {}).get("role", "")
+    if request is None:
+        return f"{prefix}:{role}:{func.__module__}.{func.__name__}"
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return f"{prefix}:{role}:{request.url.path}?{query}"
+
 
+# ----------------------- Startup -----------------------
+async def create_indexes():
+    if db is None:
+        return
+    await db["user"].create_index("email", unique=True)
+    await db["student"].create_index([("first_name", 1)])
+    await db["student"].create_index([("last_name", 1)])
+    await db["student"].create_index([("email", 1)])
+    await db["student"].create_index("name_grams")
+    await db["student"].create_index([("first_name", "text"), ("last_name", "text"), ("email", "text")])
+    await db["attendance"].create_index("date")
+    await db["attendance_record"].create_index([("student_id", 1), ("date", -1)])
+    await db["announcement"].create_index([("created_at", -1), ("title", 1)])
+    await db["announcement"].create_index([("created_by", 1), ("created_at", -1)])
+
+
+async def backfill_name_grams(batch_size: int = 500):
+    """Populate name_grams on students missing the current gram scheme; safe to re-run"""
+    if db is None:
+        return
+    cursor = db["student"].find({"name_grams_version": {"$ne": NAME_GRAMS_VERSION}}, {"first_name": 1, "last_name": 1})
+    ops = []
+    async for doc in cursor:
+        fields = name_gram_fields(doc.get("first_name"), doc.get("last_name"))
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(ops) >= batch_size:
+            await db["student"].bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        await db["student"].bulk_write(ops, ordered=False)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if db is not None:
+        # Keep serving if Mongo is down or an index can't be built; /test reports database state
+        try:
+            await db.command("ping")
+            await create_indexes()
+            await backfill_name_grams()
+        except Exception:
+            logger.exception("Database warm-up failed")
+    if REDIS_URL:
+        FastAPICache.init(RedisBackend(aioredis.from_url(REDIS_URL)), prefix="smsapi")
+    else:
+        FastAPICache.init(InMemoryBackend(), prefix="smsapi")
+    # Load the bcrypt backend now rather than on the first login
+    await get_dummy_password_hash()
+    yield
+
+
+# Shared storage keeps the login limit global across workers; without REDIS_URL it is per process
+limiter = Limiter(key_func=get_remote_address, storage_uri=REDIS_URL)
+
+app = FastAPI(title="School Management System API", lifespan=lifespan, default_response_class=ORJSONResponse)
+app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
+    allow_origins=CORS_ORIGINS,
+    # Browsers reject credentialed requests against a wildcard origin
+    allow_credentials="*" not in CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
 )
@@ -36,17 +148,103 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# Verified (password, hash) pairs keyed by digest so the raw password is never stored.
+# The stored hash is part of the key, so a password change naturally misses the cache.
+_password_cache: "OrderedDict[bytes, bool]" = OrderedDict()
+_password_cache_lock = threading.Lock()
+
+
+def _password_cache_key(plain_password: str, hashed_password: str) -> bytes:
+    return hashlib.sha256(plain_password.encode() + b"\0" + hashed_password.encode()).digest()
+
+
+def _cached_verification(key: bytes) -> Optional[bool]:
+    with _password_cache_lock:
+        result = _password_cache.get(key)
+        if result is not None:
+            _password_cache.move_to_end(key)
+        return result
+
 
+def _store_verification(key: bytes, result: bool) -> None:
+    with _password_cache_lock:
+        _password_cache[key] = result
+        _password_cache.move_to_end(key)
+        if len(_password_cache) > PASSWORD_CACHE_SIZE:
+            _password_cache.popitem(last=False)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+
+def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Returns (verified, new_hash); new_hash is set when the stored hash uses a stale cost"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    # bcrypt is CPU-bound; keep it off the event loop
+    return await asyncio.to_thread(get_password_hash, password)
+
+
+_dummy_password_hash: Optional[str] = None
+
+
+async def get_dummy_password_hash() -> str:
+    """Hash verified against when a login email is unknown, so both paths cost one bcrypt"""
+    global _dummy_password_hash
+    if _dummy_password_hash is None:
+        # Random secret so no known password can ever match it
+        _dummy_password_hash = await get_password_hash_async(secrets.token_urlsafe())
+    return _dummy_password_hash
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    key = _password_cache_key(plain_password, hashed_password)
+    cached = _cached_verification(key)
+    if cached is not None:
+        # A hash needing an upgrade is replaced on its first successful check,
+        # so cached pairs never need one
+        return cached, None
+    result, new_hash = await asyncio.to_thread(verify_password, plain_password, hashed_password)
+    _store_verification(key, result)
+    return result, new_hash
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, now: Optional[datetime] = None):
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    now = now or datetime.now(timezone.utc)
+    expire = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"iat": now, "exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+# Bump when the gram scheme changes so the startup backfill recomputes stored grams
+NAME_GRAMS_VERSION = 2
+
+
+def name_trigrams(*parts: Optional[str]) -> List[str]:
+    """Lowercase 3-grams of each word plus its 1- and 2-character leading grams"""
+    grams = set()
+    for part in parts:
+        for word in (part or "").lower().split():
+            grams.update((word[:1], word[:2]))
+            grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return sorted(grams)
+
+
+def name_gram_fields(first_name: Optional[str], last_name: Optional[str]) -> dict:
+    return {"name_grams": name_trigrams(first_name, last_name), "name_grams_version": NAME_GRAMS_VERSION}
+
+
+def autocomplete_grams(q: str) -> List[str]:
+    """Grams every matching name must contain; words under three characters match as prefixes"""
+    grams = set()
+    for word in q.lower().split():
+        if len(word) < 3:
+            grams.add(word)
+        else:
+            grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return sorted(grams)
+
+
 # ----------------------- Schemas -----------------------
 class Token(BaseModel):
     access_token: str
@@ -54,6 +252,8 @@ class Token(BaseModel):
 
 
 class RegisterRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid", validate_assignment=False)
+
     name: str
     email: EmailStr
     password: str = Field(min_length=6)
@@ -61,6 +261,8 @@ class RegisterRequest(BaseModel):
 
 
 class LoginRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid", validate_assignment=False)
+
     email: EmailStr
     password: str
 
@@ -74,6 +276,8 @@ class PublicUser(BaseModel):
 
 
 class CreateStudent(BaseModel):
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True, validate_assignment=False)
+
     first_name: str
     last_name: str
     email: Optional[EmailStr] = None
@@ -87,12 +291,49 @@ class CreateStudent(BaseModel):
     admission_date: Optional[date] = None
 
 
-class UpdateStudent(CreateStudent):
-    pass
+class UpdateStudent(BaseModel):
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True, validate_assignment=False)
+
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[EmailStr] = None
+    gender: Optional[Literal["male", "female", "other"]] = None
+    dob: Optional[date] = None
+    grade: Optional[str] = None
+    roll_number: Optional[str] = None
+    address: Optional[str] = None
+    guardian_name: Optional[str] = None
+    guardian_contact: Optional[str] = None
+    admission_date: Optional[date] = None
+
+    @field_validator("first_name", "last_name")
+    @classmethod
+    def name_not_null(cls, v: Optional[str]) -> str:
+        # Optional so it can be omitted, but a student must always keep a name
+        if v is None:
+            raise ValueError("may be omitted but not null")
+        return v
 
 
 # ----------------------- Auth Helpers -----------------------
+def _auth_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def _token_revoked(payload: dict, user: dict) -> bool:
+    # Logout bumps token_version, so tokens carrying an older version are stale
+    return payload.get("ver", 0) != user.get("token_version", 0)
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    cache_key = _auth_cache_key(token)
+    cached = _auth_cache.get(cache_key)
+    if cached is not None:
+        payload, user = cached
+        if payload.get("exp", 0) > time.time():
+            return user
+        _auth_cache.pop(cache_key, None)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: Optional[str] = payload.get("sub")
@@ -103,18 +344,34 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
     user = None
     if db is not None:
-        try:
-            user = db["user"].find_one({"_id": ObjectId(user_id)})
-        except Exception:
-            email = payload.get("email")
-            if email:
-                user = db["user"].find_one({"email": email})
+        if ObjectId.is_valid(user_id):
+            user = await db["user"].find_one({"_id": ObjectId(user_id)}, CURRENT_USER_PROJECTION)
+        elif payload.get("email"):
+            user = await db["user"].find_one({"email": payload["email"]}, CURRENT_USER_PROJECTION)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
+    if _token_revoked(payload, user):
+        raise HTTPException(status_code=401, detail="Token revoked")
     user["id"] = str(user.get("_id"))
+    _auth_cache[cache_key] = (payload, user)
     return user
 
 
+def list_pipeline(match: dict, limit: int, projection: Optional[dict] = None, sort: Optional[dict] = None) -> list:
+    """Aggregation pipeline returning documents with a string `id` in place of `_id`"""
+    pipeline = [{"$match": match}]
+    if sort:
+        pipeline.append({"$sort": sort})
+    if limit > 0:
+        pipeline.append({"$limit": limit})
+    if projection:
+        pipeline.append({"$project": {**projection, "_id": 0, "id": {"$toString": "$_id"}}})
+    else:
+        pipeline.append({"$addFields": {"id": {"$toString": "$_id"}}})
+        pipeline.append({"$project": {"_id": 0}})
+    return pipeline
+
+
 # ----------------------- Health -----------------------
 @app.get("/")
 def read_root():
@@ -127,7 +384,7 @@ def health():
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -143,7 +400,7 @@ def test_database():
             response["database_name"] = getattr(db, 'name', 'unknown')
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -157,80 +414,118 @@ def test_database():
 
 # ----------------------- Auth Endpoints -----------------------
 @app.post("/auth/register", response_model=PublicUser)
-def register(req: RegisterRequest):
+async def register(req: RegisterRequest):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
-    existing = db["user"].find_one({"email": req.email})
+    existing = await db["user"].find_one({"email": req.email})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
+    now = datetime.now(timezone.utc)
     doc = {
         "name": req.name,
         "email": str(req.email),
-        "password_hash": get_password_hash(req.password),
+        "password_hash": await get_password_hash_async(req.password),
         "role": req.role,
         "avatar_url": None,
         "is_active": True,
-        "created_at": datetime.now(timezone.utc),
-        "updated_at": datetime.now(timezone.utc),
+        "created_at": now,
+        "updated_at": now,
     }
-    res = db["user"].insert_one(doc)
+    res = await db["user"].insert_one(doc)
     return PublicUser(id=str(res.inserted_id), name=req.name, email=req.email, role=req.role)
 
 
 @app.post("/auth/login", response_model=Token)
-def login(payload: LoginRequest):
+@limiter.limit(LOGIN_RATE_LIMIT)
+async def login(request: Request, payload: LoginRequest):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
-    user = db["user"].find_one({"email": str(payload.email)})
-    if not user:
-        raise HTTPException(status_code=400, detail="Incorrect email or password")
-    if not verify_password(payload.password, user.get("password_hash", "")):
+    user = await db["user"].find_one({"email": str(payload.email)}, {"email": 1, "role": 1, "password_hash": 1, "token_version": 1})
+    hashed = (user or {}).get("password_hash") or await get_dummy_password_hash()
+    verified, new_hash = await verify_password_async(payload.password, hashed)
+    # Accounts without a stored hash never authenticate, whatever the dummy check returned
+    verified = verified and bool(user and user.get("password_hash"))
+    if not verified:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    token = create_access_token({"sub": str(user["_id"]), "email": user["email"], "role": user.get("role", "student")})
+    if new_hash:
+        # Rehash at BCRYPT_ROUNDS so every account costs the same as the dummy check
+        await db["user"].update_one({"_id": user["_id"]}, {"$set": {"password_hash": new_hash}})
+    token = create_access_token({
+        "sub": str(user["_id"]),
+        "email": user["email"],
+        "role": user.get("role", "student"),
+        "ver": user.get("token_version", 0),
+    })
     return Token(access_token=token)
 
 
+@app.post("/auth/logout")
+async def logout(token: str = Depends(oauth2_scheme), current=Depends(get_current_user)):
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database not configured")
+    await db["user"].update_one(
+        {"_id": current["_id"]},
+        {"$inc": {"token_version": 1}},
+    )
+    _auth_cache.pop(_auth_cache_key(token), None)
+    return {"status": "logged out"}
+
+
 # ----------------------- Student Endpoints -----------------------
 @app.post("/students")
-def create_student(student: CreateStudent, current=Depends(get_current_user)):
+async def create_student(student: CreateStudent, current=Depends(get_current_user)):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
     if current.get("role") not in ["admin", "teacher"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     data = student.model_dump()
-    data.update({"created_at": datetime.now(timezone.utc), "updated_at": datetime.now(timezone.utc)})
-    res = db["student"].insert_one(data)
-    return {"id": str(res.inserted_id), **student.model_dump()}
+    now = datetime.now(timezone.utc)
+    grams = name_gram_fields(data["first_name"], data["last_name"])
+    res = await db["student"].insert_one({**data, **grams, "created_at": now, "updated_at": now})
+    await FastAPICache.clear(namespace="students")
+    return {"id": str(res.inserted_id), **data}
 
 
 @app.get("/students")
-def list_students(q: Optional[str] = None, limit: int = 100, current=Depends(get_current_user)):
+@cache(expire=LIST_CACHE_TTL_SECONDS, namespace="students", key_builder=list_cache_key)
+async def list_students(
+    q: Optional[str] = None,
+    prefix: bool = False,
+    autocomplete: bool = False,
+    limit: int = 100,
+    current=Depends(get_current_user),
+):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
-    query = {}
-    if q:
+    grams = autocomplete_grams(q) if q and autocomplete else []
+    if grams:
+        # Multikey index on name_grams serves partial-name matches
+        pipeline = list_pipeline({"name_grams": {"$all": grams}}, limit, STUDENT_LIST_PROJECTION)
+    elif q and prefix:
+        # Anchored, case-sensitive regexes can use the per-field indexes
+        pattern = f"^{re.escape(q)}"
         query = {"$or": [
-            {"first_name": {"$regex": q, "$options": "i"}},
-            {"last_name": {"$regex": q, "$options": "i"}},
-            {"email": {"$regex": q, "$options": "i"}},
+            {"first_name": {"$regex": pattern}},
+            {"last_name": {"$regex": pattern}},
+            {"email": {"$regex": pattern}},
         ]}
-    docs = db["student"].find(query).limit(limit)
-    items = []
-    for d in docs:
-        d["id"] = str(d.pop("_id"))
-        items.append(d)
+        pipeline = list_pipeline(query, limit, STUDENT_LIST_PROJECTION)
+    elif q:
+        pipeline = list_pipeline({"$text": {"$search": q}}, limit, STUDENT_LIST_PROJECTION, sort={"score": {"$meta": "textScore"}})
+    else:
+        pipeline = list_pipeline({}, limit, STUDENT_LIST_PROJECTION)
+    items = await db["student"].aggregate(pipeline).to_list(length=None)
     return {"items": items}
 
 
 @app.get("/students/{student_id}")
-def get_student(student_id: str, current=Depends(get_current_user)):
+async def get_student(student_id: str, current=Depends(get_current_user)):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
-    try:
-        oid = ObjectId(student_id)
-    except Exception:
+    if not ObjectId.is_valid(student_id):
         raise HTTPException(status_code=400, detail="Invalid ID")
-    doc = db["student"].find_one({"_id": oid})
+    oid = ObjectId(student_id)
+    doc = await db["student"].find_one({"_id": oid}, {"name_grams": 0, "name_grams_version": 0})
     if not doc:
         raise HTTPException(status_code=404, detail="Not found")
     doc["id"] = str(doc.pop("_id"))
@@ -238,36 +533,42 @@ def get_student(student_id: str, current=Depends(get_current_user)):
 
 
 @app.put("/students/{student_id}")
-def update_student(student_id: str, payload: UpdateStudent, current=Depends(get_current_user)):
+async def update_student(student_id: str, payload: UpdateStudent, current=Depends(get_current_user)):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
     if current.get("role") not in ["admin", "teacher"]:
         raise HTTPException(status_code=403, detail="Not authorized")
-    try:
-        oid = ObjectId(student_id)
-    except Exception:
+    if not ObjectId.is_valid(student_id):
         raise HTTPException(status_code=400, detail="Invalid ID")
-    data = {k: v for k, v in payload.model_dump().items() if v is not None}
+    oid = ObjectId(student_id)
+    data = payload.model_dump(exclude_unset=True)
+    if "first_name" in data or "last_name" in data:
+        existing = await db["student"].find_one({"_id": oid}, {"first_name": 1, "last_name": 1})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Not found")
+        names = {**existing, **data}
+        data.update(name_gram_fields(names.get("first_name"), names.get("last_name")))
     data["updated_at"] = datetime.now(timezone.utc)
-    res = db["student"].update_one({"_id": oid}, {"$set": data})
+    res = await db["student"].update_one({"_id": oid}, {"$set": data})
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Not found")
+    await FastAPICache.clear(namespace="students")
     return {"status": "ok"}
 
 
 @app.delete("/students/{student_id}")
-def delete_student(student_id: str, current=Depends(get_current_user)):
+async def delete_student(student_id: str, current=Depends(get_current_user)):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
     if current.get("role") not in ["admin", "teacher"]:
         raise HTTPException(status_code=403, detail="Not authorized")
-    try:
-        oid = ObjectId(student_id)
-    except Exception:
+    if not ObjectId.is_valid(student_id):
         raise HTTPException(status_code=400, detail="Invalid ID")
-    res = db["student"].delete_one({"_id": oid})
+    oid = ObjectId(student_id)
+    res = await db["student"].delete_one({"_id": oid})
     if res.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Not found")
+    await FastAPICache.clear(namespace="students")
     return {"status": "deleted"}
 
 
@@ -279,13 +580,18 @@ class AttendanceRecordIn(BaseModel):
 
 
 class TakeAttendanceIn(BaseModel):
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True, validate_assignment=False)
+
     class_id: Optional[str] = None
     date: date
     records: List[AttendanceRecordIn]
 
 
+_records_adapter = TypeAdapter(List[AttendanceRecordIn])
+
+
 @app.post("/attendance")
-def take_attendance(payload: TakeAttendanceIn, current=Depends(get_current_user)):
+async def take_attendance(payload: TakeAttendanceIn, current=Depends(get_current_user)):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
     if current.get("role") not in ["admin", "teacher"]:
@@ -294,36 +600,40 @@ def take_attendance(payload: TakeAttendanceIn, current=Depends(get_current_user)
         "class_id": payload.class_id,
         "date": payload.date.isoformat(),
         "taken_by": str(current.get("_id", "")),
-        "records": [r.model_dump() for r in payload.records],
+        "records": _records_adapter.dump_python(payload.records),
         "created_at": datetime.now(timezone.utc),
     }
-    res = db["attendance"].insert_one(doc)
+    res = await db["attendance"].insert_one(doc)
+    if doc["records"]:
+        # One document per student so per-student history is an indexed lookup
+        await db["attendance_record"].insert_many(
+            [{**r, "session_id": res.inserted_id, "date": doc["date"]} for r in doc["records"]],
+            ordered=False,
+        )
     return {"id": str(res.inserted_id)}
 
 
 @app.get("/attendance")
-def list_attendance(date_str: Optional[str] = None, limit: int = 50, current=Depends(get_current_user)):
+async def list_attendance(date_str: Optional[str] = None, limit: int = 50, current=Depends(get_current_user)):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
     query = {}
     if date_str:
         query["date"] = date_str
-    docs = db["attendance"].find(query).limit(limit)
-    items = []
-    for d in docs:
-        d["id"] = str(d.pop("_id"))
-        items.append(d)
+    items = await db["attendance"].aggregate(list_pipeline(query, limit)).to_list(length=None)
     return {"items": items}
 
 
 # ----------------------- Announcements -----------------------
 class AnnouncementIn(BaseModel):
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True, validate_assignment=False)
+
     title: str
     message: str
 
 
 @app.post("/announcements")
-def create_announcement(payload: AnnouncementIn, current=Depends(get_current_user)):
+async def create_announcement(payload: AnnouncementIn, current=Depends(get_current_user)):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
     if current.get("role") not in ["admin", "teacher"]:
@@ -334,23 +644,28 @@ def create_announcement(payload: AnnouncementIn, current=Depends(get_current_use
         "created_by": str(current.get("_id", "")),
         "created_at": datetime.now(timezone.utc),
     }
-    res = db["announcement"].insert_one(doc)
+    res = await db["announcement"].insert_one(doc)
+    await FastAPICache.clear(namespace="announcements")
     return {"id": str(res.inserted_id)}
 
 
 @app.get("/announcements")
-def list_announcements(limit: int = 20, current=Depends(get_current_user)):
+@cache(expire=LIST_CACHE_TTL_SECONDS, namespace="announcements", key_builder=list_cache_key)
+async def list_announcements(limit: int = 20, current=Depends(get_current_user)):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
-    docs = db["announcement"].find({}).sort("created_at", -1).limit(limit)
-    items = []
-    for d in docs:
-        d["id"] = str(d.pop("_id"))
-        items.append(d)
+    pipeline = list_pipeline({}, limit, ANNOUNCEMENT_LIST_PROJECTION, sort={"created_at": -1})
+    items = await db["announcement"].aggregate(pipeline).to_list(length=None)
     return {"items": items}
 
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # The list cache and login rate limit are per process unless REDIS_URL is set,
+    # so only default to one worker per CPU when they are shared
+    default_workers = (os.cpu_count() or 1) if REDIS_URL else 1
+    workers = int(os.getenv("WEB_CONCURRENCY", default_workers))
+    if workers > 1 and not REDIS_URL:
+        logger.warning("WEB_CONCURRENCY > 1 without REDIS_URL: list cache and login rate limit are per worker")
+    uvicorn.run("main:app", host="0.0.0.0", port=port, loop="uvloop", http="httptools", workers=workers)
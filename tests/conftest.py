@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "db", AsyncMongoMockClient()["test"])
+    main._auth_cache.clear()
+    main.limiter.reset()
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture
+def admin_headers(client):
+    creds = {"email": "admin@example.com", "password": "secret123"}
+    client.post("/auth/register", json={"name": "Admin", "role": "admin", **creds}).raise_for_status()
+    res = client.post("/auth/login", json=creds)
+    res.raise_for_status()
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
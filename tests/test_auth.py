@@ -0,0 +1,19 @@
+import main
+
+
+def test_login_rehashes_stale_cost(client):
+    stale = main.CryptContext(schemes=["bcrypt"], bcrypt__rounds=12).hash("secret123")
+    client.portal.call(main.db["user"].insert_one, {"email": "old@example.com", "role": "student", "password_hash": stale})
+
+    res = client.post("/auth/login", json={"email": "old@example.com", "password": "secret123"})
+    assert res.status_code == 200
+
+    user = client.portal.call(main.db["user"].find_one, {"email": "old@example.com"})
+    assert user["password_hash"].startswith(f"$2b${main.BCRYPT_ROUNDS:02d}$")
+    assert main.pwd_context.verify("secret123", user["password_hash"])
+
+
+def test_login_rejects_user_without_hash(client):
+    client.portal.call(main.db["user"].insert_one, {"email": "nohash@example.com", "role": "admin"})
+    res = client.post("/auth/login", json={"email": "nohash@example.com", "password": "anything"})
+    assert res.status_code == 400
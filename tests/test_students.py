@@ -0,0 +1,33 @@
+def test_list_cache_cleared_on_create(client, admin_headers):
+    assert client.get("/students", headers=admin_headers).json()["items"] == []
+
+    res = client.post("/students", json={"first_name": "John", "last_name": "Smith"}, headers=admin_headers)
+    assert res.status_code == 200
+
+    items = client.get("/students", headers=admin_headers).json()["items"]
+    assert [(s["first_name"], s["last_name"]) for s in items] == [("John", "Smith")]
+
+
+def _names(client, headers, q):
+    res = client.get("/students", params={"q": q, "autocomplete": "true"}, headers=headers)
+    return sorted(f"{s['first_name']} {s['last_name']}" for s in res.json()["items"])
+
+
+def test_autocomplete_partial_words(client, admin_headers):
+    for first, last in [("John", "Smith"), ("Joan", "Smithers"), ("Alice", "Jones")]:
+        client.post("/students", json={"first_name": first, "last_name": last}, headers=admin_headers).raise_for_status()
+
+    assert _names(client, admin_headers, "jo") == ["Alice Jones", "Joan Smithers", "John Smith"]
+    assert _names(client, admin_headers, "jo smith") == ["Joan Smithers", "John Smith"]
+    assert _names(client, admin_headers, "john s") == ["John Smith"]
+    assert _names(client, admin_headers, "SMITHE") == ["Joan Smithers"]
+    assert _names(client, admin_headers, "al j") == ["Alice Jones"]
+
+
+def test_backfill_recomputes_stale_grams(client, admin_headers):
+    import main
+
+    client.portal.call(main.db["student"].insert_one, {"first_name": "Legacy", "last_name": "Kid", "name_grams": ["leg"]})
+    client.portal.call(main.backfill_name_grams)
+
+    assert _names(client, admin_headers, "le ki") == ["Legacy Kid"]